@@ -4,32 +4,63 @@ import threading
 import time
 from fastapi import FastAPI, Response, status
 
-from worker.twitch_worker import LAST_SUCCESSFUL_LOOP_TS, main_loop
-APP_START_TS = time.time()
+from worker import state
+from worker.config import configure_logging, get_settings
 
 app = FastAPI(title="NanoHero Worker")
 
 
+def run_worker():
+    # Imported here so the worker stack (httpx, SQLAlchemy, models) loads in
+    # the background thread, not before the HTTP server can answer probes.
+    from worker.twitch_worker import main_loop
+    main_loop()
+
+
 @app.on_event("startup")
 def start_worker_thread():
+    # Validate the configuration here (raises on missing secrets in prod) so a
+    # misconfigured instance fails to start instead of losing its worker thread.
+    configure_logging(get_settings())
     # Run the Twitch worker in background
-    t = threading.Thread(target=main_loop, daemon=True)
+    t = threading.Thread(target=run_worker, name="twitch_worker")
     t.start()
+    app.state.worker_thread = t
+
+
+@app.on_event("shutdown")
+def stop_worker_thread():
+    # Wake the worker from its wait so it exits between two batches
+    state.STOP.set()
+    app.state.worker_thread.join(timeout=10)
+
 
+@app.get("/livez", include_in_schema=False)
+def livez():
+    """
+    Liveness probe: only tells that the process and the HTTP server are up.
+    Does not look at the worker, so a stalled loop never gets the instance killed.
+    """
+    return {"status": "ok"}
 
-@app.get("/healthz", include_in_schema=False)
-def healthz():
+
+@app.get("/readyz", include_in_schema=False)
+@app.get("/healthz", include_in_schema=False)  # kept for existing probe configs
+def readyz():
     """
-    Health check that also verifies if the background worker thread is alive.
-    If the last successful loop was more than 180 seconds ago, it returns an error,
-    prompting Cloud Run to restart the instance.
+    Readiness probe that verifies if the background worker thread is alive.
+    If the thread died or the last successful loop was more than 180 seconds ago,
+    it returns an error.
     """
-  # Grâce de démarrage: tolère jusqu'à 3 min le temps que la 1ʳᵉ boucle s’exécute
-    if LAST_SUCCESSFUL_LOOP_TS == 0 and (time.time() - APP_START_TS) < 180:
-         return {"status": "ok", "detail": "worker booting"}
+    if not app.state.worker_thread.is_alive():
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content="Worker thread is not running.")
 
-    seconds_since_last_loop = time.time() - LAST_SUCCESSFUL_LOOP_TS
+    seconds_since_last_loop = (time.monotonic_ns() - state.LAST_LOOP_NS.value) / 1e9
     if seconds_since_last_loop > 180:  # 3 minutes
         return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=f"Worker thread is unhealthy. Last loop was {seconds_since_last_loop:.0f} seconds ago.")
 
+    # Grâce de démarrage: tolère jusqu'à 3 min le temps que la 1ʳᵉ boucle s’exécute
+    if state.LAST_LOOP_NS.value == state.BOOT_NS:
+        return {"status": "ok", "detail": "worker booting"}
+
     return {"status": "ok"}
@@ -7,15 +7,18 @@ from sqlalchemy import (
     Enum as SQLEnum,
     ForeignKey,
     func,
+    Index,
     Integer,
     String,
     Boolean,
     Text,
+    text,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import DeclarativeBase, relationship
 
 
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
 
 
 class UserRole(str, Enum):
@@ -68,6 +71,9 @@ class Creative(Base):
 
 class ServingLog(Base):
     __tablename__ = "serving_logs"
+    __table_args__ = (
+        Index("ix_serving_logs_ts_streamer", "ts", "streamer_id"),
+    )
     id = Column(Integer, primary_key=True)
     ts = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     streamer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -82,6 +88,10 @@ class ServingLog(Base):
 
 class Stream(Base):
     __tablename__ = "streams"
+    __table_args__ = (
+        # Active stream lookup (streamer_id = ? AND ended_at IS NULL) done every loop
+        Index("ix_streams_streamer_active", "streamer_id", postgresql_where=text("ended_at IS NULL")),
+    )
     id = Column(Integer, primary_key=True)
     streamer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,22 @@
+"""
+State shared between the worker thread and the HTTP app.
+
+Kept free of heavy imports so that http_app can read it without loading
+the worker's dependencies (httpx, SQLAlchemy, models).
+"""
+from __future__ import annotations
+
+import ctypes
+import threading
+import time
+
+
+# Monotonic time (ns) of the process start and of the last completed loop.
+# Starts equal to BOOT_NS, so the health check measures the boot grace period
+# and the loop age on the same clock, immune to wall-clock jumps.
+# This is used by http_app.py to verify the worker is still alive.
+BOOT_NS = time.monotonic_ns()
+LAST_LOOP_NS = ctypes.c_int64(BOOT_NS)
+
+# Set on shutdown to wake the worker from its wait and end the loop
+STOP = threading.Event()
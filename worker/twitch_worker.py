@@ -1,75 +1,152 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Optional
-import json
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from sqlalchemy import text
-from sqlalchemy import select
+import orjson
+import httpx
+from sqlalchemy import MetaData, text
+from sqlalchemy import bindparam, select
 
-from worker.config import get_settings
+from worker import state
+from worker.config import Settings, configure_logging, get_settings
 from worker.db import session_scope, engine
 from worker.models import Stream, User, Base
 
 
+log = logging.getLogger("twitch_worker")
+
 TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
 TWITCH_STREAMS_URL = "https://api.twitch.tv/helix/streams"
+# Helix accepts at most 100 user_id per /streams call
+TWITCH_BATCH_SIZE = 100
+# Number of Helix batches fetched concurrently
+TWITCH_FETCH_WORKERS = 4
 
-# --- Global state for health check ---
-# Timestamp of the last successfully completed loop.
-# This is used by http_app.py to verify the worker is still alive.
-LAST_SUCCESSFUL_LOOP_TS = 0
+# --- Shared HTTP client ---
+# One HTTP/2 client for every Twitch call: the TLS handshake is paid once and
+# concurrent batches are multiplexed as streams over the same connection.
+# The transport retries failed connections; _get_with_retry handles 429/5xx.
+_HTTP = httpx.Client(
+    timeout=20,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+    ),
+    headers={"Accept-Encoding": "gzip"},
+)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_ATTEMPTS = 3
+_RETRY_BACKOFF_S = 0.5
+# Longest wait for the Twitch rate-limit bucket to refill before retrying a 429
+_RATELIMIT_MAX_WAIT_S = 30.0
 
 
-def get_app_access_token() -> Optional[str]:
-    settings = get_settings()
+def _retry_delay(r: httpx.Response, attempt: int) -> float:
+    if r.status_code == 429:
+        # Ratelimit-Reset: epoch seconds at which the Twitch bucket is refilled
+        try:
+            reset_in = float(r.headers["Ratelimit-Reset"]) - time.time()
+            return min(max(reset_in, 0.0), _RATELIMIT_MAX_WAIT_S)
+        except (KeyError, ValueError):
+            pass
+    return _RETRY_BACKOFF_S * (2 ** attempt)
+
+
+def _get_with_retry(url: str, **kwargs) -> httpx.Response:
+    r = _HTTP.get(url, **kwargs)
+    for attempt in range(_RETRY_ATTEMPTS):
+        if r.status_code not in _RETRY_STATUSES:
+            break
+        if state.STOP.wait(_retry_delay(r, attempt)):
+            break
+        r = _HTTP.get(url, **kwargs)
+    return r
+
+
+# --- App access token cache ---
+# Twitch app tokens live ~60 days: keep the last one and only refresh it
+# when it gets close to expiry (or the refresh margin below).
+_TOKEN_CACHE = {"token": None, "exp": 0.0}
+_TOKEN_LOCK = threading.Lock()
+_TOKEN_REFRESH_MARGIN_S = 300
+
+# --- Last committed viewer counts ---
+# {internal_user_id: viewer_count} as written by the last successful commit,
+# so unchanged streamers (notably offline -> offline) cost no SQL. Bounded LRU.
+_LAST_VC: OrderedDict[int, int] = OrderedDict()
+_LAST_VC_MAX = 100_000
+
+
+def get_app_access_token(settings: Settings) -> Optional[str]:
     if settings.TWITCH_APP_ACCESS_TOKEN:
         return settings.TWITCH_APP_ACCESS_TOKEN
     if not settings.TWITCH_CLIENT_ID or not settings.TWITCH_CLIENT_SECRET:
-        print("[get_app_access_token] Missing TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET in config.", flush=True)
+        log.error("Missing TWITCH_CLIENT_ID or TWITCH_CLIENT_SECRET in config.")
         return None
+    with _TOKEN_LOCK:
+        if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"] - _TOKEN_REFRESH_MARGIN_S:
+            return _TOKEN_CACHE["token"]
+        token = _request_app_access_token(settings)
+        if token:
+            return token
+        # Refresh failed: keep serving the previous token while it is still valid
+        if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"]:
+            log.warning("Token refresh failed, reusing cached token until it expires.")
+            return _TOKEN_CACHE["token"]
+        return None
+
+
+def _request_app_access_token(settings: Settings) -> Optional[str]:
     try:
-        print("[get_app_access_token] Requesting app access token from Twitch...", flush=True)
-        r = requests.post(
+        log.info("Requesting app access token from Twitch...")
+        r = _HTTP.post(
             TWITCH_TOKEN_URL,
             data={
                 "client_id": settings.TWITCH_CLIENT_ID,
                 "client_secret": settings.TWITCH_CLIENT_SECRET,
                 "grant_type": "client_credentials",
             },
-            timeout=20,
         )
-        print(f"[get_app_access_token] Twitch response status={r.status_code}", flush=True)
+        log.info("Twitch token response status=%s", r.status_code)
         r.raise_for_status()
-        data = r.json()
+        data = orjson.loads(r.content)
         token = data.get("access_token")
         if not token:
-            print(f"[get_app_access_token] 'access_token' not found in Twitch response: {data}", flush=True)
+            log.error("'access_token' not found in Twitch token response: %s", data)
+            return None
+        _TOKEN_CACHE["token"] = token
+        _TOKEN_CACHE["exp"] = time.time() + int(data.get("expires_in", 0))
         return token
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Log de manière plus détaillée si c'est une erreur HTTP
-        if isinstance(e, requests.exceptions.HTTPError):
-            print(f"[get_app_access_token] HTTP error while fetching token: {e}", flush=True)
+        if isinstance(e, httpx.HTTPStatusError):
+            log.error("HTTP error while fetching token: %s", e)
             try:
-                print(f"[get_app_access_token] Twitch response body: {e.response.text}", flush=True)
+                log.error("Twitch response body: %s", e.response.text)
             except Exception:
                 pass  # Ignore si le corps de la réponse ne peut être lu
         else:
-            print(f"[get_app_access_token] Network error while fetching token: {e}", flush=True)
+            log.error("Network error while fetching token: %s", e)
         return None
     except Exception as e:
-        print(f"[get_app_access_token] Unexpected error while fetching token: {e}\n{traceback.format_exc()}", flush=True)
+        log.error("Unexpected error while fetching token: %s", e, exc_info=True)
         return None
 
 
-def fetch_viewer_counts_batch(broadcaster_ids: list[str], client_id: str, token: str) -> dict[str, int]:
+def fetch_viewer_counts_batch(broadcaster_ids: list[str], client_id: str, token: str) -> Optional[dict[str, int]]:
     """
     Fetches viewer counts for a batch of up to 100 broadcasters in a single API call.
-    Returns a dictionary mapping broadcaster_id to viewer_count.
+    Returns a dictionary mapping broadcaster_id to viewer_count (offline ones are absent),
+    or None if the call failed and the batch must be left untouched.
     """
     if not broadcaster_ids:
         return {}
@@ -79,15 +156,18 @@ def fetch_viewer_counts_batch(broadcaster_ids: list[str], client_id: str, token:
     params = [("user_id", bid) for bid in broadcaster_ids]
 
     try:
-        r = requests.get(TWITCH_STREAMS_URL, headers=headers, params=params, timeout=20)
+        r = _get_with_retry(TWITCH_STREAMS_URL, headers=headers, params=params)
         status = r.status_code
         try:
-            data = r.json()
-            preview = json.dumps(data)[:500]
-        except Exception:
+            data = orjson.loads(r.content)
+        except orjson.JSONDecodeError:
             data = {}
-            preview = r.text[:500]
-        print(f"[fetch_viewer_counts_batch] streams batch_size={len(broadcaster_ids)} status={status} payload~={preview}", flush=True)
+        log.info("Helix streams batch_size=%d status=%d", len(broadcaster_ids), status)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Helix streams payload~=%s", r.content[:500].decode("utf-8", "replace"))
+        if status == 401:
+            # Token revoked or expired early: force a refresh on the next loop
+            _TOKEN_CACHE["exp"] = 0.0
         r.raise_for_status()
 
         # Create a dict of {broadcaster_id: viewer_count} from the response
@@ -99,124 +179,259 @@ def fetch_viewer_counts_batch(broadcaster_ids: list[str], client_id: str, token:
                     viewer_counts[user_id] = int(stream_info.get("viewer_count", 0))
         return viewer_counts
 
-    except requests.exceptions.RequestException as e:
-        print(f"[fetch_viewer_counts_batch] Request error: {e}", flush=True)
-        return {}
+    except httpx.HTTPError as e:
+        log.error("Helix streams request error: %s", e)
+        return None
     except Exception as e:
-        print(f"[fetch_viewer_counts_batch] Unexpected error: {e}\n{traceback.format_exc()}", flush=True)
-        return {}
+        log.error("Unexpected error while fetching viewer counts: %s", e, exc_info=True)
+        return None
+
 
+def _remember_viewer_counts(viewer_counts: dict[int, int]) -> None:
+    for streamer_id, viewer_count in viewer_counts.items():
+        _LAST_VC[streamer_id] = viewer_count
+        _LAST_VC.move_to_end(streamer_id)
+    while len(_LAST_VC) > _LAST_VC_MAX:
+        _LAST_VC.popitem(last=False)
 
-def upsert_stream_row(streamer_id: int, viewer_count: int):
+
+def apply_viewer_counts(db, viewer_counts: dict[int, int]) -> None:
+    """
+    Applies a batch of {internal_user_id: viewer_count} to the streams table
+    using a constant number of statements, whatever the batch size.
+    """
+    if not viewer_counts:
+        return
     now = datetime.now(timezone.utc)
-    with session_scope() as db:
-        # Find active stream without ended_at
-        active = db.execute(
-            select(Stream).where(Stream.streamer_id == streamer_id, Stream.ended_at.is_(None))
-        ).scalars().first()
 
+    # One SELECT to find every active stream (no ended_at) of the batch
+    active_by_streamer = {
+        row.streamer_id: row.id
+        for row in db.execute(
+            select(Stream.id, Stream.streamer_id).where(
+                Stream.streamer_id.in_(list(viewer_counts.keys())),
+                Stream.ended_at.is_(None),
+            )
+        )
+    }
+
+    update_live = []
+    insert_new = []
+    end_ids = []
+    for streamer_id, viewer_count in viewer_counts.items():
+        stream_id = active_by_streamer.get(streamer_id)
         if viewer_count > 0:
-            if active:
-                old = active.viewer_count
-                active.viewer_count = viewer_count
-                print(f"[upsert_stream_row] Updated stream id={active.id} streamer_id={streamer_id} vc {old} -> {viewer_count}", flush=True)
+            if stream_id is not None:
+                update_live.append({"stream_id": stream_id, "vc": viewer_count})
             else:
-                new_stream = Stream(streamer_id=streamer_id, started_at=now, viewer_count=viewer_count)
-                db.add(new_stream)
-                print(f"[upsert_stream_row] Created new stream streamer_id={streamer_id} vc={viewer_count}", flush=True)
-        else:
-            if active:
-                active.ended_at = now
-                print(f"[upsert_stream_row] Ended stream id={active.id} streamer_id={streamer_id}", flush=True)
+                insert_new.append({"streamer_id": streamer_id, "started_at": now, "viewer_count": viewer_count})
+        elif stream_id is not None:
+            end_ids.append(stream_id)
+
+    # Core statements on the table: no object hydration nor unit-of-work flush
+    streams = Stream.__table__
+    if update_live:
+        db.execute(
+            streams.update().where(streams.c.id == bindparam("stream_id")).values(viewer_count=bindparam("vc")),
+            update_live,
+        )
+    if insert_new:
+        db.execute(streams.insert(), insert_new)
+    if end_ids:
+        db.execute(streams.update().where(streams.c.id.in_(end_ids)).values(ended_at=now))
+    log.info("Streams updated=%d created=%d ended=%d", len(update_live), len(insert_new), len(end_ids))
+
+
+def _compute_schema_hash() -> str:
+    # Tables, columns and indexes declared in models: any change yields a new hash
+    shape = sorted(
+        (
+            table.name,
+            sorted(column.name for column in table.columns),
+            sorted(str(index.name) for index in table.indexes),
+        )
+        for table in Base.metadata.tables.values()
+    )
+    return hashlib.sha256(repr(shape).encode()).hexdigest()
+
+
+SCHEMA_HASH = _compute_schema_hash()
+
+
+def ensure_schema() -> None:
+    """
+    Creates missing tables/columns/indexes, once per schema version. The applied hash
+    is recorded in schema_versions so that later cold starts skip the introspection.
+    """
+    with engine.begin() as conn:
+        # Transaction-scoped lock: serializes concurrent cold starts and is released
+        # at commit (safe behind PgBouncer transaction pooling).
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": int(SCHEMA_HASH[:15], 16)})
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_versions (hash TEXT PRIMARY KEY)"))
+        if conn.execute(text("SELECT 1 FROM schema_versions WHERE hash = :hash"), {"hash": SCHEMA_HASH}).first():
+            log.info("Schema %s already applied, skipping migrations.", SCHEMA_HASH[:12])
+            return
+
+        Base.metadata.create_all(bind=conn)
+        # Ensure optional columns exist on serving_logs
+        try:
+            # One statement, no catalog probe: IF NOT EXISTS (PG 9.6+) skips present columns
+            with conn.begin_nested():
+                conn.execute(text(
+                    "ALTER TABLE serving_logs"
+                    " ADD COLUMN IF NOT EXISTS width INTEGER NULL,"
+                    " ADD COLUMN IF NOT EXISTS height INTEGER NULL,"
+                    " ADD COLUMN IF NOT EXISTS visible BOOLEAN NULL,"
+                    " ADD COLUMN IF NOT EXISTS viewer_count INTEGER NULL"
+                ))
+        except Exception as mig_e:
+            # Not recorded: the migration is retried on the next start
+            log.warning("Ensure serving_logs optional columns failed: %s", mig_e)
+            return
+
+    if not _ensure_indexes_concurrently():
+        return
+
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO schema_versions (hash) VALUES (:hash) ON CONFLICT DO NOTHING"),
+            {"hash": SCHEMA_HASH},
+        )
+
+
+def _index_is_valid(conn, name: str) -> Optional[bool]:
+    # None if the index does not exist, False if a concurrent build left it INVALID
+    return conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+
+def _ensure_indexes_concurrently() -> bool:
+    """
+    create_all only emits indexes along with new tables: add the ones declared later
+    on tables that already exist. CONCURRENTLY does not block writes on populated
+    tables but cannot run in a transaction, hence the autocommit connection.
+    Returns True only if every declared index exists and is valid.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            # Detached copy, so the CONCURRENTLY option never reaches the declared
+            # indexes used by create_all inside a transaction
+            for index in table.to_metadata(MetaData()).indexes:
+                valid = _index_is_valid(conn, index.name)
+                if valid:
+                    continue
+                try:
+                    if valid is False:
+                        # Interrupted build: IF NOT EXISTS would keep the broken index forever
+                        log.warning("Index %s is invalid, rebuilding it.", index.name)
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {quote(index.name)}"))
+                    index.dialect_kwargs["postgresql_concurrently"] = True
+                    index.create(bind=conn)
+                except Exception as idx_e:
+                    # Not recorded: the index is retried on the next start
+                    log.warning("Creating index %s failed: %s", index.name, idx_e)
+                    return False
+                if not _index_is_valid(conn, index.name):
+                    log.warning("Index %s is still invalid after its build.", index.name)
+                    return False
+    return True
 
 
 def main_loop():
-    global LAST_SUCCESSFUL_LOOP_TS
     settings = get_settings()
     # Ensure DB tables exist (in case API wasn't hit yet)
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        Base.metadata.create_all(bind=engine)
-        # Ensure optional columns exist on serving_logs
-        try:
-            with engine.begin() as conn:
-                existing = {r[0] for r in conn.execute(text(
-                    "SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name='serving_logs'"
-                ))}
-                if "width" not in existing:
-                    conn.execute(text("ALTER TABLE serving_logs ADD COLUMN width INTEGER NULL"))
-                if "height" not in existing:
-                    conn.execute(text("ALTER TABLE serving_logs ADD COLUMN height INTEGER NULL"))
-                if "visible" not in existing:
-                    conn.execute(text("ALTER TABLE serving_logs ADD COLUMN visible BOOLEAN NULL"))
-                if "viewer_count" not in existing:
-                    conn.execute(text("ALTER TABLE serving_logs ADD COLUMN viewer_count INTEGER NULL"))
-        except Exception as mig_e:
-            print(f"[twitch_worker] Warning: ensure serving_logs optional columns failed: {mig_e}", flush=True)
-        print("[twitch_worker] DB ready and tables ensured.", flush=True)
+        ensure_schema()
+        log.info("DB ready and tables ensured.")
     except Exception as e:
-        print(f"[twitch_worker] Warning: could not ensure DB tables at start: {e}", flush=True)
+        log.warning("Could not ensure DB tables at start: %s", e)
     # Config snapshot (masked)
     cid = settings.TWITCH_CLIENT_ID or ''
-    print(f"[twitch_worker] Config: TWITCH_CLIENT_ID len={len(cid)} present={bool(cid)}", flush=True)
+    log.info("Config: TWITCH_CLIENT_ID len=%d present=%s", len(cid), bool(cid))
     # Do not print DATABASE_URL, but confirm presence
-    from worker.config import get_settings as _gs
-    try:
-        print(f"[twitch_worker] Config: DATABASE_URL present={bool(_gs().DATABASE_URL)}", flush=True)
-    except Exception:
-        print("[twitch_worker] Config: DATABASE_URL not readable", flush=True)
+    log.info("Config: DATABASE_URL present=%s", bool(settings.DATABASE_URL))
 
-    while True:
+    while not state.STOP.is_set():
         try:
-            print("\n[twitch_worker] --- Starting new loop iteration ---", flush=True)
-            token = get_app_access_token()
-            if not token:
-                print("[twitch_worker] Could not get Twitch token. Retrying in 60s.", flush=True)
-                time.sleep(60)
-                continue
-
+            log.info("--- Starting new loop iteration ---")
             # Fetch streamer data inside the session, but process it outside
             # to avoid holding a DB connection open during long network requests.
-            streamer_infos = []
-            print("[twitch_worker] Opening DB session to fetch streamers...", flush=True)
+            log.debug("Opening DB session to fetch streamers...")
             with session_scope() as db:
-                # Select only the columns we need to avoid holding onto the full User object
-                # outside the session. This returns a list of Row objects (like tuples).
-                streamer_infos = db.execute(
+                # Select only the columns we need. The result is buffered (one round-trip,
+                # no server-side cursor) and split by the Twitch batch size: each partition
+                # directly becomes a {twitch_id: internal_user_id} batch.
+                result = db.execute(
                     select(User.id, User.twitch_broadcaster_id).where(User.twitch_broadcaster_id.isnot(None))
-                ).all()
-                print(f"[twitch_worker] Fetched data for {len(streamer_infos)} streamers: {streamer_infos}", flush=True)
-            print("[twitch_worker] DB session closed. Starting to process streamers.", flush=True)
-            
+                )
+                batches = [
+                    {row.twitch_broadcaster_id: row.id for row in partition}
+                    for partition in result.partitions(TWITCH_BATCH_SIZE)
+                ]
+            streamer_count = sum(len(batch) for batch in batches)
+            log.info("Fetched data for %d streamers.", streamer_count)
+            log.debug("DB session closed. Starting to process streamers.")
+
+            # Nothing tracked yet: no Twitch token nor API call needed for this loop
+            if not batches:
+                log.info("No streamer to track. Skipping Twitch calls.")
+                state.LAST_LOOP_NS.value = time.monotonic_ns()
+                if state.STOP.wait(60):
+                    break
+                continue
+
+            token = get_app_access_token(settings)
+            if not token:
+                log.warning("Could not get Twitch token. Retrying in 60s.")
+                if state.STOP.wait(60):
+                    break
+                continue
+
             # --- Process streamers in batches of 100 (Twitch API limit) ---
-            # Create a map of twitch_id -> internal_user_id for efficient lookup
-            streamer_id_map = {s.twitch_broadcaster_id: s.id for s in streamer_infos if s.twitch_broadcaster_id}
-            all_broadcaster_ids = list(streamer_id_map.keys())
-            print(f"[twitch_worker] Found {len(all_broadcaster_ids)} broadcaster IDs to process.", flush=True)
-            
-            for i in range(0, len(all_broadcaster_ids), 100):
-                batch_ids = all_broadcaster_ids[i:i + 100]
-                print(f"[twitch_worker] Processing batch of {len(batch_ids)} broadcaster IDs.", flush=True)
-                
-                live_streams_data = fetch_viewer_counts_batch(batch_ids, settings.TWITCH_CLIENT_ID, token)
-                live_broadcaster_ids = set(live_streams_data.keys())
-
-                # Process only the streamers in the current batch
-                for twitch_id in batch_ids:
-                    internal_user_id = streamer_id_map[twitch_id]
+            log.info("Fetching %d batch(es) of broadcaster IDs.", len(batches))
+
+            # Twitch calls run concurrently (multiplexed on the shared HTTP/2 client); DB writes stay
+            # in this thread so each batch keeps its own simple transaction.
+            with ThreadPoolExecutor(max_workers=TWITCH_FETCH_WORKERS) as executor:
+                results = list(executor.map(
+                    lambda batch: (batch, fetch_viewer_counts_batch(list(batch), settings.TWITCH_CLIENT_ID, token)),
+                    batches,
+                ))
+
+            for batch, live_streams_data in results:
+                if state.STOP.is_set():
+                    break
+                if live_streams_data is None:
+                    # Failed call: do not mistake the batch for offline streamers
+                    log.warning("Skipping batch of %d streamers after a failed Helix call.", len(batch))
+                    continue
+                # Process only the streamers in the current batch, in a single transaction
+                # Only streamers whose count changed since the last committed loop
+                viewer_counts = {}
+                for twitch_id, internal_user_id in batch.items():
                     viewer_count = live_streams_data.get(twitch_id, 0)
-                    upsert_stream_row(internal_user_id, viewer_count)
+                    if _LAST_VC.get(internal_user_id) != viewer_count:
+                        viewer_counts[internal_user_id] = viewer_count
+                if not viewer_counts:
+                    continue
+                with session_scope() as db:
+                    apply_viewer_counts(db, viewer_counts)
+                _remember_viewer_counts(viewer_counts)
 
         except Exception as e:
-            print(f"[twitch_worker] !! FATAL loop error: {type(e).__name__} - {str(e)}\n{traceback.format_exc()}", flush=True)
+            log.error("!! FATAL loop error: %s - %s", type(e).__name__, e, exc_info=True)
 
         # At the end of every loop (even if there were errors processing some streamers),
         # update the healthcheck timestamp to show the main thread is alive.
-        LAST_SUCCESSFUL_LOOP_TS = time.time()
-        print(f"[twitch_worker] Loop finished. Healthcheck timestamp updated to {LAST_SUCCESSFUL_LOOP_TS}", flush=True)
-        time.sleep(60)
+        state.LAST_LOOP_NS.value = time.monotonic_ns()
+        log.info("Loop finished. Healthcheck timestamp updated to %d", state.LAST_LOOP_NS.value)
+        if state.STOP.wait(60):
+            break
+    log.info("Stop requested, worker loop exited.")
 
 
 if __name__ == "__main__":
+    configure_logging(get_settings())
     main_loop()